@@ -1,10 +1,16 @@
 # analytics_s3.py
-import os, json, uuid, datetime as dt
-from typing import Dict, Iterable, Tuple
-from flask import Blueprint, request, jsonify
+import os, json, gzip, zlib, heapq, uuid, time, queue, atexit, logging, functools, threading, datetime as dt
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+from flask import Blueprint, Response, request
 
 import boto3
-from botocore.exceptions import ClientError
+import orjson
+import xxhash
+from cachetools import TTLCache, cached
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, EventStreamError
 
 analytics_bp = Blueprint("analytics", __name__, url_prefix="/api")
 
@@ -13,8 +19,57 @@ S3_BUCKET = os.environ["ANALYTICS_S3_BUCKET"]           # REQUIRED
 S3_PREFIX = os.getenv("ANALYTICS_S3_PREFIX", "events")  # e.g. "events"
 # Partitioning style: events/yyyy/mm/dd/hh/<uuid>.json
 # You may also choose minute-level if you expect very high volumes.
+# Events are buffered in-process and flushed as gzipped NDJSON batches:
+#   events/yyyy/mm/dd/hh/batch-<uuid>.ndjson.gz
+# Batching keeps PUT rates far below S3's per-prefix limit, so sharding is
+# opt-in. With ANALYTICS_S3_SHARDS=N (max 256) batches go under a 2-hex-char
+# shard, and every shard is listed per hour (N extra LISTs per hour read):
+#   events/<shard>/yyyy/mm/dd/hh/batch-<uuid>.ndjson.gz
+# S3_SHARDS may be raised but never lowered, or data goes unlisted. Set
+# ANALYTICS_S3_SHARD_CUTOVER (UTC, e.g. 2026-10-15T00:00) to when sharding
+# went live: earlier hours list only the unsharded prefix, later ones only shards.
+S3_SHARDS = min(256, max(0, int(os.getenv("ANALYTICS_S3_SHARDS", "0"))))
+_cutover = os.getenv("ANALYTICS_S3_SHARD_CUTOVER")
+SHARD_CUTOVER = dt.datetime.fromisoformat(_cutover.rstrip("Z")) if _cutover else None
+MAX_BATCH = int(os.getenv("ANALYTICS_MAX_BATCH", "500"))             # events per S3 object
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))  # seconds
+MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "100000"))          # events buffered before /track sheds load
+DRAIN_TIMEOUT = 25  # seconds to wait for an in-flight flush at shutdown (< gunicorn graceful_timeout)
+# S3 fan-out concurrency; raise these for wide windows with many prefixes.
+READ_WORKERS = int(os.getenv("ANALYTICS_READ_WORKERS", "32"))  # concurrent GETs when aggregating
+LIST_WORKERS = int(os.getenv("ANALYTICS_LIST_WORKERS", "8"))   # concurrent hour-prefix listings
+RANGE_WORKERS = 8  # parallel byte-range GETs per large object
+LARGE_OBJECT_THRESHOLD = 8 * 1024 * 1024  # bytes; smaller objects use one GET
+# Completed days are rolled up to rollup/yyyy/mm/dd.json so reads skip raw events.
+ROLLUP_PREFIX = os.getenv("ANALYTICS_ROLLUP_PREFIX", "rollup")
+ROLLUP_GRACE = dt.timedelta(hours=1)  # let late batches land before freezing a day
+ROLLUP_WORKERS = 8  # days loaded (or built) concurrently per request
+RESPONSE_TTL = 60    # seconds; identical dashboard queries are served from RAM
+ROLLUP_TTL = 3600    # seconds; rollups of closed days are immutable
 
-s3 = boto3.client("s3")
+# S3 Select for batch reads; turned off for the process after its first rejection.
+_select_enabled = os.getenv("ANALYTICS_S3_SELECT", "1").lower() in ("1", "true", "yes")
+
+# Set if the bucket has S3 Transfer Acceleration enabled.
+S3_ACCELERATE = os.getenv("ANALYTICS_S3_ACCELERATE", "").lower() in ("1", "true", "yes")
+
+# One client shared by all threads; pool sized to cover every worker at once,
+# adaptive retries so fan-out backs off on 503 SlowDown instead of failing.
+_S3_CFG = Config(
+    max_pool_connections=max(64, READ_WORKERS + LIST_WORKERS + RANGE_WORKERS + ROLLUP_WORKERS),
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    tcp_keepalive=True,
+    read_timeout=30,
+    connect_timeout=5,
+    s3={"use_accelerate_endpoint": S3_ACCELERATE},
+)
+s3 = boto3.client("s3", config=_S3_CFG)
+_read_pool = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="analytics-read")
+_list_pool = ThreadPoolExecutor(max_workers=LIST_WORKERS, thread_name_prefix="analytics-list")
+_range_pool = ThreadPoolExecutor(max_workers=RANGE_WORKERS, thread_name_prefix="analytics-range")
+# Separate from _read_pool: rollup builds submit to _read_pool/_list_pool themselves.
+_rollup_pool = ThreadPoolExecutor(max_workers=ROLLUP_WORKERS, thread_name_prefix="analytics-rollup")
+log = logging.getLogger(__name__)
 
 def _now():
     return dt.datetime.utcnow().replace(microsecond=0)
@@ -22,15 +77,24 @@ def _now():
 def _now_iso():
     return _now().isoformat() + "Z"
 
-def _hour_prefix(ts: dt.datetime) -> str:
-    return f"{S3_PREFIX}/{ts.year:04d}/{ts.month:02d}/{ts.day:02d}/{ts.hour:02d}/"
+def _hour_prefix(ts: dt.datetime, shard: int = None) -> str:
+    """Hour partition for a write shard; shard=None is the legacy unsharded layout."""
+    hour = f"{ts.year:04d}/{ts.month:02d}/{ts.day:02d}/{ts.hour:02d}/"
+    if shard is None:
+        return f"{S3_PREFIX}/{hour}"
+    return f"{S3_PREFIX}/{shard:02x}/{hour}"
 
 def _hourly_prefixes_between(since: dt.datetime, until: dt.datetime) -> Iterable[str]:
-    """Generate hour partitions covering [since, until]."""
+    """Generate hour partitions covering [since, until] (unsharded and/or every shard)."""
     cur = since.replace(minute=0, second=0, microsecond=0)
     end = until.replace(minute=0, second=0, microsecond=0)
     while cur <= end:
-        yield _hour_prefix(cur)
+        # an hour straddling the cutover lists both layouts
+        if SHARD_CUTOVER is None or cur < SHARD_CUTOVER:
+            yield _hour_prefix(cur)
+        if S3_SHARDS and (SHARD_CUTOVER is None or cur + dt.timedelta(hours=1) > SHARD_CUTOVER):
+            for shard in range(S3_SHARDS):
+                yield _hour_prefix(cur, shard)
         cur += dt.timedelta(hours=1)
 
 def _parse_window(window: str) -> int:
@@ -41,12 +105,114 @@ def _parse_window(window: str) -> int:
         return max(1, int(window[:-1]) * 24)
     return 24*7
 
+@functools.lru_cache(maxsize=10000)
+def _anon_id(ip: str, ua: str) -> str:
+    """Stable anonymous id for a (client ip, user agent) pair (unseeded, so fixed across restarts)."""
+    return f"anon_{xxhash.xxh3_128_hexdigest(f'{ip}|{ua}')}"
+
+def _json(obj, status: int = 200) -> Response:
+    """JSON response via orjson; obj may already be encoded bytes."""
+    body = obj if isinstance(obj, bytes) else orjson.dumps(obj)
+    return Response(body, status=status, mimetype="application/json")
+
 def _safe_json(obj) -> bytes:
     try:
+        return orjson.dumps(obj)
+    except Exception:
+        pass
+    try:  # e.g. non-str dict keys or >64-bit ints inside client-supplied meta
         return json.dumps(obj, ensure_ascii=False).encode("utf-8")
     except Exception:
         return b"{}"
 
+# ---------- Batched writer ----------
+_queue: "queue.Queue[Tuple[dt.datetime, Dict]]" = queue.Queue(maxsize=MAX_QUEUE)
+_stop = threading.Event()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+def _ensure_flusher():
+    """Start the background flusher on first use, or restart it if it died."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if (_flusher is None or not _flusher.is_alive()) and not _stop.is_set():
+            if _flusher is not None:
+                log.error("analytics flusher died; restarting")
+            _flusher = threading.Thread(target=_flush_loop, name="analytics-flusher", daemon=True)
+            _flusher.start()
+
+def _next_batch() -> List[Tuple[dt.datetime, Dict]]:
+    """Block for the first event, then coalesce until MAX_BATCH or FLUSH_INTERVAL."""
+    try:
+        first = _queue.get(timeout=FLUSH_INTERVAL)
+    except queue.Empty:
+        return []
+    batch = [first] if first is not None else []  # None is _drain's wake-up sentinel
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < MAX_BATCH and not _stop.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = _queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if item is None:
+            break
+        batch.append(item)
+    return batch
+
+def _write_batch(batch: List[Tuple[dt.datetime, Dict]]):
+    """PUT one NDJSON object per hour partition touched by the batch."""
+    by_hour: Dict[dt.datetime, List[Dict]] = defaultdict(list)
+    for ts, event in batch:
+        by_hour[ts.replace(minute=0, second=0)].append(event)
+    for hour, events in by_hour.items():
+        batch_id = uuid.uuid4()
+        shard = batch_id.int % S3_SHARDS if S3_SHARDS else None
+        key = f"{_hour_prefix(hour, shard)}batch-{batch_id}.ndjson.gz"
+        body = gzip.compress(b"\n".join(_safe_json(e) for e in events), compresslevel=6)
+        try:
+            s3.put_object(Bucket=S3_BUCKET, Key=key, Body=body)
+        except (ClientError, BotoCoreError):
+            log.exception("S3 put failed for %s (%d events dropped)", key, len(events))
+
+def _flush_loop():
+    while not _stop.is_set():
+        try:
+            batch = _next_batch()
+            if batch:
+                _write_batch(batch)
+        except Exception:
+            log.exception("analytics flush failed")
+
+@atexit.register
+def _drain():
+    """Flush whatever is still queued when the process shuts down."""
+    _stop.set()
+    if _flusher is not None:
+        try:
+            _queue.put_nowait(None)  # wake a flusher blocked on an empty queue
+        except queue.Full:
+            pass  # a full queue never blocks it
+        _flusher.join(timeout=DRAIN_TIMEOUT)
+    batch = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            continue
+        batch.append(item)
+        if len(batch) >= MAX_BATCH:
+            _write_batch(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+
 # ------------- Write: /api/track -------------
 @analytics_bp.route("/track", methods=["POST"])
 def track():
@@ -64,94 +230,280 @@ def track():
     action = (data.get("action") or "").strip().lower()
     meta = data.get("meta") or {}
 
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr or "")
+    ua = request.headers.get("User-Agent", "")
+
     # Resolve user_id priority: explicit > header > cookie > ip/UA hash
-    import uuid as _uuid
     user_id = (data.get("user_id") or request.headers.get("X-User-Id") or "").strip()
     if not user_id:
         user_id = request.cookies.get("cid", "")
     if not user_id:
-        ip = request.headers.get("X-Forwarded-For", request.remote_addr or "")
-        ua = request.headers.get("User-Agent", "")
-        user_id = f"anon_{_uuid.uuid5(_uuid.NAMESPACE_DNS, f'{ip}|{ua}')}"
+        user_id = _anon_id(ip, ua)
 
     if not module or not action:
-        return jsonify({"ok": False, "error": "module and action are required"}), 400
+        return _json({"ok": False, "error": "module and action are required"}, 400)
 
     ts = _now()
+    ts_iso = ts.isoformat() + "Z"
+    event_id = str(uuid.uuid4())
     event = {
-        "id": str(uuid.uuid4()),
-        "ts_utc": ts.isoformat() + "Z",
+        "id": event_id,
+        "ts_utc": ts_iso,
         "user_id": user_id[:128],
         "module": module[:64],
         "action": action[:64],
         "meta": meta or {},
-        "ip": request.headers.get("X-Forwarded-For", request.remote_addr or ""),
-        "user_agent": request.headers.get("User-Agent", ""),
+        "ip": ip,
+        "user_agent": ua,
     }
 
-    key = f"{_hour_prefix(ts)}{event['id']}.json"
+    _ensure_flusher()
     try:
-        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=_safe_json(event))
-    except ClientError as e:
-        return jsonify({"ok": False, "error": f"S3 put failed: {e}"}), 500
+        _queue.put_nowait((ts, event))
+    except queue.Full:
+        log.warning("analytics queue full (%d events); dropping event %s", MAX_QUEUE, event_id)
+        return _json({"ok": False, "error": "event queue full"}, 503)
 
-    return jsonify({"ok": True, "id": event["id"], "ts_utc": event["ts_utc"]})
+    return _json({"ok": True, "id": event_id, "ts_utc": ts_iso})
 
 # ---------- Helpers to read & aggregate ----------
+def _list_prefix(prefix: str) -> List[str]:
+    paginator = s3.get_paginator("list_objects_v2")
+    pages = paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix, PaginationConfig={"PageSize": 1000})
+    return [obj["Key"] for page in pages for obj in page.get("Contents", [])]
+
 def _list_event_keys(since: dt.datetime, until: dt.datetime) -> Iterable[str]:
     """List S3 object keys under hour partitions for [since, until]."""
-    for prefix in _hourly_prefixes_between(since, until):
-        continuation = None
-        while True:
-            kwargs = {"Bucket": S3_BUCKET, "Prefix": prefix}
-            if continuation: kwargs["ContinuationToken"] = continuation
-            resp = s3.list_objects_v2(**kwargs)
-            for obj in resp.get("Contents", []):
-                yield obj["Key"]
-            if resp.get("IsTruncated"):
-                continuation = resp["NextContinuationToken"]
-            else:
-                break
-
-def _load_event(key: str) -> Dict:
+    for keys in _list_pool.map(_list_prefix, _hourly_prefixes_between(since, until)):
+        yield from keys
+
+def _parse_lines(lines: Iterable[bytes]) -> Iterator[Dict]:
+    for line in lines:
+        if not line: continue
+        try:
+            yield orjson.loads(line)
+        except Exception:
+            continue
+
+def _get_ranged(key: str, size: int) -> bytearray:
+    """Fetch a large object as RANGE_WORKERS parallel byte-range GETs."""
+    buf = bytearray(size)
+    chunk = -(-size // RANGE_WORKERS)
+
+    def fetch(start: int):
+        end = min(start + chunk, size) - 1
+        part = s3.get_object(Bucket=S3_BUCKET, Key=key, Range=f"bytes={start}-{end}")["Body"].read()
+        buf[start:start + len(part)] = part
+
+    list(_range_pool.map(fetch, range(0, size, chunk)))
+    return buf
+
+def _read_body(key: str, obj: Dict) -> bytes:
+    """Read a get_object response, switching to range GETs past the threshold."""
+    if obj["ContentLength"] > LARGE_OBJECT_THRESHOLD:
+        obj["Body"].close()
+        return _get_ranged(key, obj["ContentLength"])
+    return obj["Body"].read()
+
+def _is_batch(key: str) -> bool:
+    return key.endswith((".ndjson", ".ndjson.gz"))
+
+def _split_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Re-split arbitrary byte chunks into lines, carrying partial lines over."""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    yield pending
+
+def _gunzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    d = zlib.decompressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        yield d.decompress(chunk)
+    yield d.flush()
+
+def _iter_events(key: str) -> Iterator[Dict]:
+    """
+    Stream events from one object: a single-event .json or an NDJSON batch.
+    Batches are parsed line by line off the response body, so peak memory
+    stays at one chunk rather than the whole object. Very large batches
+    are pulled with parallel range GETs first, since one stream is
+    throughput-bound.
+    """
     obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    b = obj["Body"].read()
+    gz = key.endswith(".gz")
+    if not _is_batch(key):
+        yield from _parse_lines([obj["Body"].read()])
+    elif obj["ContentLength"] > LARGE_OBJECT_THRESHOLD:
+        body = _read_body(key, obj)
+        yield from _parse_lines((gzip.decompress(body) if gz else body).splitlines())
+    elif gz:
+        yield from _parse_lines(_split_chunks(_gunzip_chunks(obj["Body"].iter_chunks(chunk_size=65536))))
+    else:
+        yield from _parse_lines(obj["Body"].iter_lines(chunk_size=65536))
+
+def _iter_select_records(resp) -> Iterator[Dict]:
+    # a record may continue in the next event-stream message
+    payloads = (ev["Records"]["Payload"] for ev in resp["Payload"] if "Records" in ev)
+    yield from _parse_lines(_split_chunks(payloads))
+
+def _select_events(key: str, module_filter: str = None) -> Iterator[Dict]:
+    """
+    Push projection (and the module filter) down to S3 Select for an NDJSON
+    batch, so only the columns we aggregate on cross the wire.
+    """
+    expr = "SELECT s.module, s.user_id, s.ts_utc FROM S3Object s"
+    if module_filter:
+        expr += " WHERE s.module = '%s'" % module_filter.replace("'", "''")
+    resp = s3.select_object_content(
+        Bucket=S3_BUCKET, Key=key,
+        ExpressionType="SQL", Expression=expr,
+        InputSerialization={
+            "JSON": {"Type": "LINES"},
+            "CompressionType": "GZIP" if key.endswith(".gz") else "NONE",
+        },
+        OutputSerialization={"JSON": {}},
+    )
+    return _iter_select_records(resp)
+
+def _fetch_events(key: str, module_filter: str = None) -> Iterator[Dict]:
+    """S3 Select for NDJSON batches; plain GET for tiny single-event keys."""
+    global _select_enabled
+    if _select_enabled and _is_batch(key):
+        try:
+            return _select_events(key, module_filter)
+        except ClientError:
+            # S3 Select unavailable for this bucket/account -> full reads from now on
+            _select_enabled = False
+            log.warning("S3 Select rejected for %s; using plain GETs for this process", key, exc_info=True)
+    return _iter_events(key)
+
+# Grains: fold a (day, module, user_id) row down to what a caller aggregates on,
+# so /timeseries never keys anything by user and /stats never by day.
+def _full_grain(day: str, mod: str, uid: str) -> Tuple:
+    return (day, mod, uid)
+
+def _group_grain(day: str, mod: str, uid: str) -> Tuple:
+    return (mod, uid)
+
+def _daily_grain(day: str, mod: str, uid: str) -> Tuple:
+    return (day, mod)
+
+def _count_key(key: str, module_filter: str = None, grain=_full_grain) -> Dict[Tuple, int]:
+    """Count one object's events, keyed by grain(day, module, user_id)."""
+    def rows(events: Iterator[Dict]):
+        for ev in events:
+            if not ev: continue
+            mod = ev.get("module") or "unknown"
+            if module_filter and mod != module_filter:  # exact match after lowercasing in write path
+                continue
+            yield grain(ev.get("ts_utc", "")[:10], mod, ev.get("user_id", "na"))  # YYYY-MM-DD
     try:
-        return json.loads(b.decode("utf-8"))
-    except Exception:
-        return {}
+        return Counter(rows(_fetch_events(key, module_filter)))
+    except EventStreamError:
+        # Select stream broke mid-object; partial counts are discarded, recount from a GET
+        log.warning("S3 Select stream failed for %s; re-reading", key, exc_info=True)
+        return Counter(rows(_iter_events(key)))
+
+def _count_rows(keys: Iterable[str], module_filter: str = None, grain=_full_grain) -> Dict[Tuple, int]:
+    """Merge per-object counts; each object is streamed and counted on a read worker."""
+    counts: Dict[Tuple, int] = Counter()
+    count_key = functools.partial(_count_key, module_filter=module_filter, grain=grain)
+    for part in _read_pool.map(count_key, list(keys)):
+        counts.update(part)
+    return counts
 
-def _aggregate(keys: Iterable[str], module_filter: str = None) -> Tuple[Dict, Dict]:
+# ---------- Daily rollups ----------
+def _rollup_key(day: dt.date) -> str:
+    return f"{ROLLUP_PREFIX}/{day.year:04d}/{day.month:02d}/{day.day:02d}.json"
+
+def _build_daily_rollup(day: dt.date) -> Dict[Tuple[str, str, str], int]:
     """
-    Returns:
-      by_group: dict for /stats
-      daily: dict for /timeseries  -> { 'YYYY-MM-DD': {module: count} }
+    Aggregate one day of raw events to (day, module, user_id) -> count and
+    store it. Coarser grouping sets (module, user, day x module) are all
+    derived from this base cuboid at read time. Safe to run from a cron job;
+    reads also build missing rollups lazily.
     """
-    by_group: Dict[Tuple, int] = {}
-    users_by_group: Dict[Tuple, set] = {}
-    daily: Dict[str, Dict[str, int]] = {}
+    start = dt.datetime.combine(day, dt.time())
+    until = start + dt.timedelta(days=1) - dt.timedelta(seconds=1)
+    counts = _count_rows(_list_event_keys(start, until))
+    body = {
+        "day": day.isoformat(),
+        "built_utc": _now_iso(),
+        "rows": [[mod, uid, cnt] for (_day, mod, uid), cnt in counts.items()],
+    }
+    try:
+        s3.put_object(Bucket=S3_BUCKET, Key=_rollup_key(day), Body=_safe_json(body))
+    except ClientError:
+        log.exception("S3 put failed for rollup %s", day)
+    return counts
 
-    for k in keys:
-        ev = _load_event(k)
-        if not ev: continue
-        mod = ev.get("module") or "unknown"
-        if module_filter and mod != module_filter:  # exact match after lowercasing in write path
-            continue
-        ts = ev.get("ts_utc", "")[:10]  # YYYY-MM-DD
-        uid = ev.get("user_id", "na")
-        # group by module and user/module combos based on later query
-        # We'll compute flexible groupings in route by reshaping this map.
+@cached(TTLCache(maxsize=512, ttl=ROLLUP_TTL), lock=threading.Lock())
+def _load_daily_rollup(day: dt.date) -> Dict[Tuple[str, str, str], int]:
+    try:
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=_rollup_key(day))
+    except s3.exceptions.NoSuchKey:
+        return _build_daily_rollup(day)
+    d = day.isoformat()
+    return {(d, mod, uid): cnt for mod, uid, cnt in orjson.loads(_read_body(_rollup_key(day), obj))["rows"]}
 
-        # daily timeseries
-        daily.setdefault(ts, {})
-        daily[ts][mod] = daily[ts].get(mod, 0) + 1
+def _window_counts(since: dt.datetime, until: dt.datetime, module_filter: str = None, grain=_full_grain) -> Dict[Tuple, int]:
+    """
+    Counts keyed by grain(day, module, user_id) over [since, until]: rollups
+    for fully-completed days, raw events for the rest.
+    """
+    counts: Dict[Tuple, int] = Counter()
+    rollup_days: List[dt.date] = []
+    raw_keys: List[str] = []
+    day = since.date()
+    while day <= until.date():
+        start = dt.datetime.combine(day, dt.time())
+        end = start + dt.timedelta(days=1)
+        if since <= start and end + ROLLUP_GRACE <= until:
+            rollup_days.append(day)
+        else:
+            raw_keys.extend(_list_event_keys(max(since, start), min(until, end - dt.timedelta(seconds=1))))
+        day += dt.timedelta(days=1)
+    for rollup in _rollup_pool.map(_load_daily_rollup, rollup_days):
+        for (d, mod, uid), cnt in rollup.items():
+            if module_filter and mod != module_filter:
+                continue
+            counts[grain(d, mod, uid)] += cnt
+    counts.update(_count_rows(raw_keys, module_filter, grain))
+    return counts
 
-        # store raw for flexible regroup later
-        g = (mod, uid)
-        by_group[g] = by_group.get(g, 0) + 1
-        users_by_group.setdefault((mod,), set()).add(uid)
+def _aggregate_groups(since: dt.datetime, until: dt.datetime, module_filter: str = None) -> Dict[Tuple, int]:
+    """by_group for /stats -> { (module, user_id): count }"""
+    return _window_counts(since, until, module_filter, _group_grain)
 
-    return by_group, daily
+def _aggregate_daily(since: dt.datetime, until: dt.datetime, module_filter: str = None) -> Dict[str, Dict[str, int]]:
+    """daily for /timeseries -> { 'YYYY-MM-DD': {module: count} }"""
+    daily: Dict[str, Dict[str, int]] = defaultdict(Counter)
+    for (day, mod), cnt in _window_counts(since, until, module_filter, _daily_grain).items():
+        daily[day][mod] = cnt
+    return daily
+
+# ---------- Response cache ----------
+_response_cache = TTLCache(maxsize=256, ttl=RESPONSE_TTL)
+_response_lock = threading.Lock()
+
+def _hour_floor(ts: dt.datetime) -> dt.datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _cached_response(key: Tuple, build) -> bytes:
+    """
+    Return the encoded payload cached under key, building it on a miss.
+    Keys use hour-rounded bounds so requests a few minutes apart share an
+    entry; hits skip serialization as well as S3.
+    """
+    with _response_lock:
+        body = _response_cache.get(key)
+    if body is None:
+        body = orjson.dumps(build())
+        with _response_lock:
+            _response_cache[key] = body
+    return body
 
 # ------------- Read: /api/stats -------------
 @analytics_bp.route("/stats", methods=["GET"])
@@ -171,39 +523,42 @@ def stats():
     until = _now()
     since = until - dt.timedelta(hours=hours)
 
-    keys = list(_list_event_keys(since, until))
-    by_group_raw, _daily = _aggregate(keys, module_filter=module_filter)
+    key = ("stats", window, by, module_filter, _hour_floor(since), _hour_floor(until))
+    return _json(_cached_response(key, lambda: _stats_payload(window, by, module_filter, since, until)))
+
+def _stats_payload(window: str, by: str, module_filter: str, since: dt.datetime, until: dt.datetime) -> Dict:
+    by_group_raw = _aggregate_groups(since, until, module_filter=module_filter)
 
     # reshape into requested grouping
     results = []
     if by == "module":
         # aggregate counts and unique users per module
-        per_mod = {}
-        users = {}
+        per_mod = Counter()
+        users = defaultdict(set)
         for (mod, uid), cnt in by_group_raw.items():
-            per_mod[mod] = per_mod.get(mod, 0) + cnt
-            users.setdefault(mod, set()).add(uid)
-        for mod, cnt in sorted(per_mod.items(), key=lambda x: x[1], reverse=True)[:500]:
-            results.append({"module": mod, "events": cnt, "users": len(users.get(mod, set()))})
+            per_mod[mod] += cnt
+            users[mod].add(uid)
+        for mod, cnt in heapq.nlargest(500, per_mod.items(), key=lambda x: x[1]):
+            results.append({"module": mod, "events": cnt, "users": len(users[mod])})
     elif by == "user":
         # total per user (across modules)
-        per_user = {}
+        per_user = Counter()
         for (_mod, uid), cnt in by_group_raw.items():
-            per_user[uid] = per_user.get(uid, 0) + cnt
-        for uid, cnt in sorted(per_user.items(), key=lambda x: x[1], reverse=True)[:500]:
+            per_user[uid] += cnt
+        for uid, cnt in heapq.nlargest(500, per_user.items(), key=lambda x: x[1]):
             results.append({"user_id": uid, "events": cnt})
     else:  # "module,user"
-        for (mod, uid), cnt in sorted(by_group_raw.items(), key=lambda x: x[1], reverse=True)[:500]:
+        for (mod, uid), cnt in heapq.nlargest(500, by_group_raw.items(), key=lambda x: x[1]):
             results.append({"module": mod, "user_id": uid, "events": cnt})
 
-    return jsonify({
+    return {
         "ok": True,
         "window": window,
         "since_utc": since.isoformat() + "Z",
         "until_utc": until.isoformat() + "Z",
         "group_by": by,
         "results": results
-    })
+    }
 
 # ------------- Read: /api/timeseries -------------
 @analytics_bp.route("/timeseries", methods=["GET"])
@@ -222,11 +577,14 @@ def timeseries():
     until = _now()
     since = until - dt.timedelta(hours=hours)
 
-    keys = list(_list_event_keys(since, until))
-    _by_group, daily = _aggregate(keys, module_filter=module_filter)
-    return jsonify({
+    key = ("timeseries", window, None, module_filter, _hour_floor(since), _hour_floor(until))
+    return _json(_cached_response(key, lambda: _timeseries_payload(module_filter, since, until)))
+
+def _timeseries_payload(module_filter: str, since: dt.datetime, until: dt.datetime) -> Dict:
+    daily = _aggregate_daily(since, until, module_filter=module_filter)
+    return {
         "ok": True,
         "since_utc": since.isoformat() + "Z",
         "until_utc": until.isoformat() + "Z",
         "series": daily  # { 'YYYY-MM-DD': {module: count} }
-    })
+    }
@@ -5,5 +5,7 @@ from analytics_s3 import analytics_bp
 app = Flask(__name__)
 app.register_blueprint(analytics_bp)
 
+# Production: `gunicorn app:app` (settings in gunicorn.conf.py; WEB_CONCURRENCY
+# sets the worker count). app.run below is the local dev server only.
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
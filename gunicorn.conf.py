@@ -0,0 +1,16 @@
+# gunicorn.conf.py -- picked up automatically by `gunicorn app:app`
+#
+#   gunicorn app:app            # production (this config)
+#   python app.py               # local dev server only
+#
+# gthread workers let one request's S3 I/O overlap with others. Each worker
+# process keeps its own event queue, flusher thread and S3 client, so the app
+# is not preloaded (boto3 clients must not be shared across fork).
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))   # processes
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))  # request threads per worker
+preload_app = False
+graceful_timeout = 30  # time for the atexit hook to flush queued events